@@ -10,18 +10,23 @@ This script demonstrates the complete training process for:
 import torch
 import torch.nn as nn
 import torch.optim as optim
-from torch.utils.data import DataLoader, Dataset
+from torch.utils.data import DataLoader, Dataset, Sampler
 from torchvision import transforms, models
 import albumentations as A
 from albumentations.pytorch import ToTensorV2
+import kornia.augmentation as K
 import mlflow
 import mlflow.pytorch
 from ultralytics import YOLO
 import numpy as np
 from pathlib import Path
 import cv2
+import os
+import random
+import hashlib
 from typing import Tuple, List, Dict
 import logging
+import time
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -40,6 +45,7 @@ class Config:
     TRAIN_DIR = DATA_DIR / "train"
     VAL_DIR = DATA_DIR / "val"
     TEST_DIR = DATA_DIR / "test"
+    REID_CACHE_DIR = DATA_DIR / "reid_cache"  # Pre-decoded uint8 image memmaps
     OUTPUT_DIR = Path("output/models")
     
     # Detection Model
@@ -54,10 +60,23 @@ class Config:
     REID_BATCH = 32
     REID_LR = 1e-4
     TRIPLET_MARGIN = 0.3
+    BATCH_HARD_MINING = True  # PK batches + batch-hard loss instead of random triplets
+    REID_P = 8  # identities per batch
+    REID_K = 4  # images per identity
+    REID_ACCUM_STEPS = 4  # Micro-batches per optimizer step
+    XBM_SIZE = 4096  # Cross-batch memory of past embeddings for batch-hard (0 disables)
+    XBM_START_EPOCH = 1  # Fill the memory once embeddings have settled
+    REID_VAL_EVERY = 5  # Epochs between validation passes
+    USE_REID_CACHE = True  # Decode images once into REID_CACHE_DIR
+    REID_CACHE_SIZE = 256  # Short-side resize before the REID_IMG_SIZE crop (cached at this size)
+    REID_IMG_SIZE = 224
     
     # Hardware
     DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
     NUM_WORKERS = 8
+    AUTOTUNE_WORKERS = True  # Time a few batches per worker count at startup
+    USE_AMP = torch.cuda.is_available()  # FP16 autocast + GradScaler
+    COMPILE_MODEL = True  # torch.compile (Inductor) when available
     
     # MLflow
     MLFLOW_TRACKING_URI = "http://localhost:5000"
@@ -72,52 +91,50 @@ class AugmentationPipeline:
     """Advanced augmentation for livestock images"""
     
     @staticmethod
-    def get_training_transforms():
-        """Training augmentations with weather/lighting variations"""
+    def get_training_transforms(img_size: int = 224, resize_size: int = 256):
+        """
+        CPU-side training augmentations: short-side resize, random crop and
+        weather effects that only exist in albumentations. Returns uint8 CHW
+        tensors; lighting, blur, flip and normalization run on the GPU
+        (get_gpu_training_transforms). The resize is a no-op on cached images.
+        """
         return A.Compose([
-            A.RandomBrightnessContrast(
-                brightness_limit=0.3,
-                contrast_limit=0.3,
-                p=0.5
-            ),
-            A.OneOf([
-                A.GaussianBlur(blur_limit=3),
-                A.MedianBlur(blur_limit=3),
-                A.MotionBlur(blur_limit=3),
-            ], p=0.3),
-            A.HorizontalFlip(p=0.5),
+            A.SmallestMaxSize(max_size=resize_size),
+            A.RandomCrop(img_size, img_size),
             A.RandomRain(
                 slant_lower=-10,
                 slant_upper=10,
                 drop_length=20,
-                p=0.2
+                p=0.1
             ),
             A.RandomFog(
                 fog_coef_lower=0.1,
                 fog_coef_upper=0.3,
-                p=0.2
-            ),
-            A.RandomShadow(p=0.3),
-            A.HueSaturationValue(
-                hue_shift_limit=20,
-                sat_shift_limit=30,
-                val_shift_limit=20,
-                p=0.3
-            ),
-            A.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
+                p=0.1
             ),
+            A.RandomShadow(p=0.15),
             ToTensorV2()
-        ], bbox_params=A.BboxParams(
-            format='yolo',
-            label_fields=['class_labels']
-        ))
+        ])
     
     @staticmethod
-    def get_validation_transforms():
-        """Validation transforms (no augmentation)"""
+    def get_gpu_training_transforms():
+        """Batched GPU augmentations, applied to float images in [0, 1]"""
+        return nn.Sequential(
+            K.ColorJitter(brightness=0.3, contrast=0.3, saturation=0.3, hue=0.1, p=0.5),
+            K.RandomGaussianBlur((3, 3), (0.1, 2.0), p=0.3),
+            K.RandomHorizontalFlip(p=0.5),
+            K.Normalize(
+                mean=torch.tensor([0.485, 0.456, 0.406]),
+                std=torch.tensor([0.229, 0.224, 0.225])
+            )
+        )
+    
+    @staticmethod
+    def get_validation_transforms(img_size: int = 224, resize_size: int = 256):
+        """Validation transforms (no augmentation): short-side resize + center crop"""
         return A.Compose([
+            A.SmallestMaxSize(max_size=resize_size),
+            A.CenterCrop(img_size, img_size),
             A.Normalize(
                 mean=[0.485, 0.456, 0.406],
                 std=[0.229, 0.224, 0.225]
@@ -136,12 +153,27 @@ class ReIDNetwork(nn.Module):
     Uses ResNet50 backbone with triplet loss for metric learning.
     """
     
-    def __init__(self, embedding_dim: int = 512, num_animals: int = 1000):
+    def __init__(
+        self,
+        embedding_dim: int = 512,
+        num_animals: int = 1000,
+        use_classifier: bool = True,
+        freeze_early_stages: bool = False
+    ):
         super(ReIDNetwork, self).__init__()
         
         # Backbone: ResNet50 pretrained on ImageNet
         self.backbone = models.resnet50(pretrained=True)
         
+        # Standard ReID finetuning: keep the stem and layer1 at their
+        # ImageNet weights (no grads, frozen BN stats)
+        self.frozen_stages = []
+        if freeze_early_stages:
+            self.frozen_stages = [self.backbone.conv1, self.backbone.bn1, self.backbone.layer1]
+            for stage in self.frozen_stages:
+                for param in stage.parameters():
+                    param.requires_grad = False
+        
         # Remove final FC layer
         num_features = self.backbone.fc.in_features
         self.backbone.fc = nn.Identity()
@@ -157,7 +189,14 @@ class ReIDNetwork(nn.Module):
         )
         
         # Classification head (optional, for supervised learning)
-        self.classifier = nn.Linear(embedding_dim, num_animals)
+        self.classifier = nn.Linear(embedding_dim, num_animals) if use_classifier else None
+    
+    def train(self, mode: bool = True):
+        """Set train/eval mode, keeping frozen stages in eval (BN stats fixed)"""
+        super(ReIDNetwork, self).train(mode)
+        for stage in self.frozen_stages:
+            stage.eval()
+        return self
         
     def forward(self, x):
         """Forward pass"""
@@ -169,6 +208,8 @@ class ReIDNetwork(nn.Module):
     
     def forward_classifier(self, x):
         """Forward with classification"""
+        if self.classifier is None:
+            raise RuntimeError("ReIDNetwork was built with use_classifier=False")
         embeddings = self.forward(x)
         logits = self.classifier(embeddings)
         return embeddings, logits
@@ -178,10 +219,28 @@ class ReIDNetwork(nn.Module):
 # TRIPLET LOSS
 # ============================================================================
 
+@torch.jit.script
+def triplet_loss_fn(
+    anchor: torch.Tensor,
+    positive: torch.Tensor,
+    negative: torch.Tensor,
+    margin: float
+) -> torch.Tensor:
+    """Scripted so the fuser merges the mul/sum/relu/mean chain into one kernel"""
+    pos_sim = (anchor * positive).sum(1)
+    neg_sim = (anchor * negative).sum(1)
+    
+    # (2 - 2*pos_sim) - (2 - 2*neg_sim) + margin
+    return torch.relu(2 * (neg_sim - pos_sim) + margin).mean()
+
+
 class TripletLoss(nn.Module):
     """
     Triplet loss for metric learning.
     Ensures: d(anchor, positive) < d(anchor, negative) + margin
+    
+    Expects L2-normalized embeddings (as returned by ReIDNetwork.forward),
+    for which the squared distance is ||a - b||^2 = 2 - 2 * (a . b).
     """
     
     def __init__(self, margin: float = 0.3):
@@ -196,20 +255,89 @@ class TripletLoss(nn.Module):
     ) -> torch.Tensor:
         """
         Args:
-            anchor: Embeddings of anchor samples (N, D)
-            positive: Embeddings of positive samples (N, D)
-            negative: Embeddings of negative samples (N, D)
+            anchor: Unit-norm embeddings of anchor samples (N, D)
+            positive: Unit-norm embeddings of positive samples (N, D)
+            negative: Unit-norm embeddings of negative samples (N, D)
+        
+        Returns:
+            Triplet loss value
+        """
+        return triplet_loss_fn(anchor, positive, negative, self.margin)
+
+
+class BatchHardTripletLoss(nn.Module):
+    """
+    Batch-hard triplet loss over a PK batch.
+    For each anchor, uses the farthest positive and the closest negative
+    in the batch, so every sample contributes an informative gradient.
+    """
+    
+    def __init__(self, margin: float = 0.3):
+        super(BatchHardTripletLoss, self).__init__()
+        self.margin = margin
+        
+    def forward(
+        self,
+        embeddings: torch.Tensor,
+        labels: torch.Tensor,
+        memory_embeddings: torch.Tensor = None,
+        memory_labels: torch.Tensor = None
+    ) -> torch.Tensor:
+        """
+        Args:
+            embeddings: Embeddings of the batch (N, D)
+            labels: Integer identity labels (N,)
+            memory_embeddings: Optional detached embeddings from past batches (M, D),
+                searched for hard positives/negatives alongside the batch
+            memory_labels: Identity labels of the memory (M,)
         
         Returns:
             Triplet loss value
         """
-        pos_distance = (anchor - positive).pow(2).sum(1)
-        neg_distance = (anchor - negative).pow(2).sum(1)
+        candidates, candidate_labels = embeddings, labels
+        if memory_embeddings is not None and memory_embeddings.size(0) > 0:
+            candidates = torch.cat([embeddings, memory_embeddings.to(embeddings.dtype)])
+            candidate_labels = torch.cat([labels, memory_labels])
+        
+        dist = torch.cdist(embeddings, candidates)
+        same = labels[:, None] == candidate_labels[None, :]
+        
+        hardest_pos = (dist * same.float()).max(1).values
+        hardest_neg = dist.masked_fill(same, float('inf')).min(1).values
         
-        losses = torch.relu(pos_distance - neg_distance + self.margin)
+        losses = torch.relu(hardest_pos - hardest_neg + self.margin)
         return losses.mean()
 
 
+class CrossBatchMemory:
+    """
+    FIFO bank of detached embeddings from recent batches (XBM).
+    Gives batch-hard mining a large negative pool without keeping the
+    activations of past batches alive for backward.
+    """
+    
+    def __init__(self, size: int, embedding_dim: int, device: str):
+        self.size = size
+        self.embeddings = torch.zeros(size, embedding_dim, device=device)
+        self.labels = torch.zeros(size, dtype=torch.long, device=device)
+        self.ptr = 0
+        self.count = 0
+    
+    @torch.no_grad()
+    def enqueue(self, embeddings: torch.Tensor, labels: torch.Tensor):
+        """Overwrite the oldest entries with a batch"""
+        n = embeddings.size(0)
+        idx = (torch.arange(n, device=self.embeddings.device) + self.ptr) % self.size
+        self.embeddings[idx] = embeddings.detach().float()
+        self.labels[idx] = labels
+        self.ptr = (self.ptr + n) % self.size
+        self.count = min(self.count + n, self.size)
+    
+    def get(self) -> Tuple[torch.Tensor, torch.Tensor]:
+        """Filled part of the memory"""
+        return self.embeddings[:self.count], self.labels[:self.count]
+
+
 # ============================================================================
 # REID DATASET
 # ============================================================================
@@ -221,34 +349,58 @@ class ReIDDataset(Dataset):
         self,
         data_dir: Path,
         transform=None,
-        triplet_sampling: bool = True
+        triplet_sampling: bool = True,
+        cache_dir: Path = None
     ):
         self.data_dir = data_dir
         self.transform = transform
         self.triplet_sampling = triplet_sampling
+        self.cache_dir = cache_dir
+        self._cache = None  # Opened lazily so each worker maps its own view
         
         # Load dataset
-        self.samples = self._load_samples()
-        self.animal_to_images = self._build_index()
+        if cache_dir is not None:
+            self.samples, self.animal_to_images = self._load_cached_samples()
+        else:
+            self.samples, self.animal_to_images = self._load_samples()
+        self.animal_ids = list(self.animal_to_images.keys())
+        self.id_to_idx = {aid: i for i, aid in enumerate(self.animal_ids)}
         
-    def _load_samples(self) -> List[Tuple[Path, str]]:
-        """Load all image paths and their animal IDs"""
+    def _load_samples(self) -> Tuple[List[Tuple[str, str]], Dict[str, List[int]]]:
+        """
+        Load all image paths and their animal IDs in a single directory walk
+        
+        Returns:
+            samples: (image path, animal_id) pairs
+            index: animal_id -> sample indices
+        """
         samples = []
-        for animal_dir in self.data_dir.iterdir():
-            if animal_dir.is_dir():
-                animal_id = animal_dir.name
-                for img_path in animal_dir.glob("*.jpg"):
-                    samples.append((img_path, animal_id))
-        return samples
-    
-    def _build_index(self) -> Dict[str, List[int]]:
-        """Build index mapping animal_id -> sample indices"""
         index = {}
-        for idx, (_, animal_id) in enumerate(self.samples):
-            if animal_id not in index:
-                index[animal_id] = []
-            index[animal_id].append(idx)
-        return index
+        for entry in os.scandir(self.data_dir):
+            if entry.is_dir():
+                animal_id = entry.name
+                for img in os.scandir(entry.path):
+                    if img.name.endswith(".jpg"):
+                        index.setdefault(animal_id, []).append(len(samples))
+                        samples.append((img.path, animal_id))
+        return samples, index
+    
+    def _load_cached_samples(self) -> Tuple[List[Tuple[str, str]], Dict[str, List[int]]]:
+        """Load sample list and index written by prepare_cache"""
+        meta = np.load(self.cache_dir / "index.npz")
+        self.cache_shape = tuple(meta["shape"])
+        
+        samples = list(zip(meta["paths"].tolist(), meta["animal_ids"].tolist()))
+        index = {}
+        for idx, (_, animal_id) in enumerate(samples):
+            index.setdefault(animal_id, []).append(idx)
+        return samples, index
+    
+    def __getstate__(self):
+        # Never pickle an open memmap into worker processes (it would be copied)
+        state = self.__dict__.copy()
+        state['_cache'] = None
+        return state
     
     def __len__(self):
         return len(self.samples)
@@ -259,41 +411,55 @@ class ReIDDataset(Dataset):
         else:
             return self._get_single(idx)
     
+    def _load_image(self, idx) -> np.ndarray:
+        """Decode sample image as RGB"""
+        if self.cache_dir is not None:
+            if self._cache is None:
+                self._cache = np.memmap(
+                    self.cache_dir / "images.u8",
+                    dtype=np.uint8,
+                    mode='r',
+                    shape=self.cache_shape
+                )
+            return np.array(self._cache[idx])  # Plain slice, no decode
+        
+        img_path, _ = self.samples[idx]
+        image = cv2.imread(img_path, cv2.IMREAD_COLOR)
+        return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    
     def _get_single(self, idx):
-        """Get single sample (for validation)"""
-        img_path, animal_id = self.samples[idx]
-        image = cv2.imread(str(img_path))
-        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+        """Get single sample and its integer identity label"""
+        _, animal_id = self.samples[idx]
+        image = self._load_image(idx)
         
         if self.transform:
             image = self.transform(image=image)['image']
         
-        return image, animal_id
+        return image, self.id_to_idx[animal_id]
     
     def _get_triplet(self, idx):
         """Sample anchor, positive, negative triplet"""
         # Anchor
-        anchor_path, anchor_id = self.samples[idx]
-        anchor_img = cv2.imread(str(anchor_path))
-        anchor_img = cv2.cvtColor(anchor_img, cv2.COLOR_BGR2RGB)
+        _, anchor_id = self.samples[idx]
+        anchor_img = self._load_image(idx)
         
         # Positive (same animal, different image)
-        pos_indices = [i for i in self.animal_to_images[anchor_id] if i != idx]
-        if len(pos_indices) == 0:
+        pos_indices = self.animal_to_images[anchor_id]
+        if len(pos_indices) == 1:
             pos_idx = idx  # Fallback
         else:
-            pos_idx = np.random.choice(pos_indices)
-        pos_path, _ = self.samples[pos_idx]
-        pos_img = cv2.imread(str(pos_path))
-        pos_img = cv2.cvtColor(pos_img, cv2.COLOR_BGR2RGB)
-        
-        # Negative (different animal)
-        neg_animal_ids = [aid for aid in self.animal_to_images.keys() if aid != anchor_id]
-        neg_animal_id = np.random.choice(neg_animal_ids)
-        neg_idx = np.random.choice(self.animal_to_images[neg_animal_id])
-        neg_path, _ = self.samples[neg_idx]
-        neg_img = cv2.imread(str(neg_path))
-        neg_img = cv2.cvtColor(neg_img, cv2.COLOR_BGR2RGB)
+            pos_idx = idx
+            while pos_idx == idx:
+                pos_idx = random.choice(pos_indices)
+        pos_img = self._load_image(pos_idx)
+        
+        # Negative (different animal): draw from all ids but the anchor's
+        # by shifting indices at/after the anchor up by one
+        j = random.randrange(len(self.animal_ids) - 1)
+        j += j >= self.id_to_idx[anchor_id]
+        neg_animal_id = self.animal_ids[j]
+        neg_idx = random.choice(self.animal_to_images[neg_animal_id])
+        neg_img = self._load_image(neg_idx)
         
         # Apply transforms
         if self.transform:
@@ -304,6 +470,198 @@ class ReIDDataset(Dataset):
         return anchor_img, pos_img, neg_img, anchor_id
 
 
+class PKSampler(Sampler):
+    """
+    Batch sampler yielding P identities x K images per batch.
+    Identities with fewer than K images are sampled with replacement.
+    """
+    
+    def __init__(self, animal_to_images: Dict[str, List[int]], p: int = 8, k: int = 4):
+        self.animal_to_images = animal_to_images
+        self.animal_ids = list(animal_to_images.keys())
+        self.p = min(p, len(self.animal_ids))
+        self.k = k
+        self.num_samples = sum(len(indices) for indices in animal_to_images.values())
+    
+    def __len__(self):
+        return max(1, self.num_samples // (self.p * self.k))
+    
+    def __iter__(self):
+        for _ in range(len(self)):
+            batch = []
+            for animal_id in random.sample(self.animal_ids, self.p):
+                indices = self.animal_to_images[animal_id]
+                if len(indices) >= self.k:
+                    batch.extend(random.sample(indices, self.k))
+                else:
+                    batch.extend(random.choices(indices, k=self.k))
+            yield batch
+
+
+def cache_fingerprint(samples: List[Tuple[str, str]], size: int) -> str:
+    """Identity of the image set and cached image size a cache is built from"""
+    digest = hashlib.sha1(f"center-crop {size}\n".encode())
+    for path, _ in sorted(samples):
+        digest.update(path.encode())
+        digest.update(b"\n")
+    return digest.hexdigest()
+
+
+def cache_is_stale(data_dir: Path, cache_dir: Path, size: int) -> bool:
+    """True if cache_dir is missing or was built from other images or another size"""
+    index_path = cache_dir / "index.npz"
+    if not index_path.exists():
+        return True
+    meta = np.load(index_path)
+    if "fingerprint" not in meta.files:
+        return True  # Written before fingerprints were stored
+    samples = ReIDDataset(data_dir, triplet_sampling=False).samples
+    if str(meta["fingerprint"]) != cache_fingerprint(samples, size):
+        logger.info(f"ReID cache {cache_dir} is out of date with {data_dir}; rebuilding")
+        return True
+    return False
+
+
+def prepare_cache(data_dir: Path, cache_dir: Path, size: int = 256):
+    """
+    Decode every ReID image once into a uint8 memmap, resized on the short
+    side to `size` and center-cropped square (aspect ratio preserved).
+    
+    Writes images.u8 of shape (N, size, size, 3) in RGB plus index.npz
+    (paths, animal_ids, shape, fingerprint) in ReIDDataset sample order.
+    """
+    dataset = ReIDDataset(data_dir, triplet_sampling=False)
+    shape = (len(dataset), size, size, 3)
+    logger.info(f"Caching {len(dataset)} images from {data_dir} to {cache_dir}")
+    
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    cache = np.memmap(cache_dir / "images.u8", dtype=np.uint8, mode='w+', shape=shape)
+    for idx in range(len(dataset)):
+        image = dataset._load_image(idx)
+        h, w = image.shape[:2]
+        scale = size / min(h, w)
+        new_w, new_h = max(size, round(w * scale)), max(size, round(h * scale))
+        image = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_AREA)
+        top, left = (new_h - size) // 2, (new_w - size) // 2
+        cache[idx] = image[top:top + size, left:left + size]
+    cache.flush()
+    del cache
+    
+    paths, animal_ids = zip(*dataset.samples) if dataset.samples else ((), ())
+    np.savez(
+        cache_dir / "index.npz",
+        paths=np.array(paths, dtype=str),
+        animal_ids=np.array(animal_ids, dtype=str),
+        shape=np.array(shape),
+        fingerprint=np.array(cache_fingerprint(dataset.samples, size))
+    )
+
+
+def gpu_augment(images: torch.Tensor, augs: nn.Module) -> torch.Tensor:
+    """Augment a uint8 NCHW batch already on the device into normalized channels_last floats"""
+    images = augs(images.float().div_(255))
+    return images.contiguous(memory_format=torch.channels_last)
+
+
+# ============================================================================
+# REID EVALUATION
+# ============================================================================
+
+def reid_retrieval_metrics(
+    embeddings: torch.Tensor,
+    labels: torch.Tensor,
+    chunk_size: int = 1024
+) -> Tuple[float, float]:
+    """
+    Mean pairwise distance and rank-1 accuracy, computed in row tiles.
+    
+    Each tile uses ||q||^2 + ||g||^2 - 2 q.g^T (one GEMM) instead of the
+    broadcast subtraction in cdist, so peak memory is chunk_size x N.
+    
+    Args:
+        embeddings: Embeddings of the whole set (N, D)
+        labels: Integer identity labels (N,)
+        chunk_size: Query rows per tile
+    
+    Returns:
+        (mean pairwise distance, rank-1 accuracy)
+    """
+    num_samples = embeddings.size(0)
+    sq_norms = embeddings.pow(2).sum(1)
+    dist_sum = torch.zeros((), device=embeddings.device)
+    correct = torch.zeros((), device=embeddings.device)
+    
+    for start in range(0, num_samples, chunk_size):
+        query = embeddings[start:start + chunk_size]
+        rows = torch.arange(query.size(0), device=embeddings.device)
+        query_idx = rows + start
+        
+        dist = torch.addmm(sq_norms[None, :], query, embeddings.T, alpha=-2)
+        dist.add_(sq_norms[query_idx, None]).clamp_min_(1e-12).sqrt_()
+        dist_sum += dist.sum()
+        
+        # Rank-1: nearest neighbour other than the query itself
+        dist[rows, query_idx] = float('inf')
+        nearest = dist.argmin(1)
+        correct += (labels[nearest] == labels[query_idx]).sum()
+    
+    mean_distance = (dist_sum / (num_samples * num_samples)).item()
+    rank1 = (correct / num_samples).item()
+    return mean_distance, rank1
+
+
+# ============================================================================
+# DATA LOADING
+# ============================================================================
+
+def loader_kwargs(num_workers: int) -> Dict:
+    """DataLoader options for async, pinned host->device transfers"""
+    kwargs = {"num_workers": num_workers, "pin_memory": True}
+    if num_workers > 0:
+        kwargs.update(persistent_workers=True, prefetch_factor=4)
+    return kwargs
+
+
+def tune_num_workers(
+    dataset: Dataset,
+    candidates: Tuple[int, ...] = (0, 2, 4, 8, 12, 16),
+    num_batches: int = 20,
+    **loader_args
+) -> int:
+    """
+    Pick the fastest num_workers by timing a few batches for each candidate.
+    
+    Args:
+        dataset: Dataset to load from
+        candidates: Worker counts to try (those above the CPU count are skipped)
+        num_batches: Batches to time per candidate (after the first one)
+        **loader_args: Batching arguments forwarded to DataLoader
+    
+    Returns:
+        Fastest worker count
+    """
+    cpu_count = os.cpu_count() or 1
+    candidates = tuple(n for n in candidates if n <= cpu_count) or (0,)
+    best_workers, best_time = candidates[0], float('inf')
+    
+    for num_workers in candidates:
+        loader = DataLoader(dataset, num_workers=num_workers, pin_memory=True, **loader_args)
+        iterator = iter(loader)
+        next(iterator, None)  # Exclude worker startup
+        
+        start = time.perf_counter()
+        for _, _ in zip(range(num_batches), iterator):
+            pass
+        elapsed = time.perf_counter() - start
+        del iterator, loader
+        
+        logger.info(f"num_workers={num_workers}: {elapsed:.2f}s / {num_batches} batches")
+        if elapsed < best_time:
+            best_workers, best_time = num_workers, elapsed
+    
+    return best_workers
+
+
 # ============================================================================
 # TRAINING FUNCTIONS
 # ============================================================================
@@ -375,42 +733,106 @@ def train_reid_model(config: Config):
     
     # Initialize MLflow
     with mlflow.start_run(run_name="reid_network"):
+        # Decode-once image caches
+        train_cache = val_cache = None
+        if config.USE_REID_CACHE:
+            train_cache = config.REID_CACHE_DIR / "train"
+            val_cache = config.REID_CACHE_DIR / "val"
+            for data_dir, cache_dir in [
+                (config.TRAIN_DIR / "reid", train_cache),
+                (config.VAL_DIR / "reid", val_cache)
+            ]:
+                # Rebuilt when images were added/removed or REID_CACHE_SIZE changed
+                if cache_is_stale(data_dir, cache_dir, config.REID_CACHE_SIZE):
+                    prepare_cache(data_dir, cache_dir, size=config.REID_CACHE_SIZE)
+        
         # Data loaders
         train_dataset = ReIDDataset(
             config.TRAIN_DIR / "reid",
-            transform=AugmentationPipeline.get_training_transforms(),
-            triplet_sampling=True
+            transform=AugmentationPipeline.get_training_transforms(
+                config.REID_IMG_SIZE, config.REID_CACHE_SIZE
+            ),
+            triplet_sampling=not config.BATCH_HARD_MINING,
+            cache_dir=train_cache
         )
         val_dataset = ReIDDataset(
             config.VAL_DIR / "reid",
-            transform=AugmentationPipeline.get_validation_transforms(),
-            triplet_sampling=False
+            transform=AugmentationPipeline.get_validation_transforms(
+                config.REID_IMG_SIZE, config.REID_CACHE_SIZE
+            ),
+            triplet_sampling=False,
+            cache_dir=val_cache
         )
         
+        if config.BATCH_HARD_MINING:
+            train_batching = {
+                "batch_sampler": PKSampler(
+                    train_dataset.animal_to_images,
+                    p=config.REID_P,
+                    k=config.REID_K
+                )
+            }
+        else:
+            train_batching = {"batch_size": config.REID_BATCH, "shuffle": True}
+        
+        num_workers = config.NUM_WORKERS
+        if config.AUTOTUNE_WORKERS:
+            num_workers = tune_num_workers(train_dataset, **train_batching)
+            logger.info(
+                f"Using tuned num_workers={num_workers} "
+                f"(overrides NUM_WORKERS={config.NUM_WORKERS})"
+            )
+        
         train_loader = DataLoader(
             train_dataset,
-            batch_size=config.REID_BATCH,
-            shuffle=True,
-            num_workers=config.NUM_WORKERS,
-            pin_memory=True
+            **train_batching,
+            **loader_kwargs(num_workers)
         )
         val_loader = DataLoader(
             val_dataset,
             batch_size=config.REID_BATCH,
             shuffle=False,
-            num_workers=config.NUM_WORKERS
+            **loader_kwargs(num_workers)
         )
         
         # Model
         num_animals = len(train_dataset.animal_to_images)
         model = ReIDNetwork(
             embedding_dim=config.REID_EMBEDDING_DIM,
-            num_animals=num_animals
-        ).to(config.DEVICE)
+            num_animals=num_animals,
+            use_classifier=False,  # Pure triplet training never uses the head
+            freeze_early_stages=True
+        ).to(config.DEVICE, memory_format=torch.channels_last)
+        
+        gpu_augs = AugmentationPipeline.get_gpu_training_transforms().to(config.DEVICE)
+        
+        # Fixed 224x224 inputs: let cuDNN benchmark conv algorithms once
+        torch.backends.cudnn.benchmark = True
+        
+        # Compiled wrapper shares parameters with `model`, which is kept for
+        # state_dict/saving so checkpoint keys stay unprefixed. No CUDA graphs:
+        # graph replays overwrite their output buffers in place, which would
+        # clobber the embeddings validation keeps for the retrieval metrics
+        # and the .grad buffers accumulated across REID_ACCUM_STEPS backwards
+        compiled_model = model
+        if config.COMPILE_MODEL and hasattr(torch, "compile"):
+            compiled_model = torch.compile(
+                model,
+                dynamic=False,
+                options={"max_autotune": True, "triton.cudagraphs": False}
+            )
         
         # Loss and optimizer
-        triplet_loss = TripletLoss(margin=config.TRIPLET_MARGIN)
-        optimizer = optim.AdamW(model.parameters(), lr=config.REID_LR, weight_decay=1e-4)
+        if config.BATCH_HARD_MINING:
+            triplet_loss = BatchHardTripletLoss(margin=config.TRIPLET_MARGIN)
+        else:
+            triplet_loss = TripletLoss(margin=config.TRIPLET_MARGIN)
+        optimizer = optim.AdamW(
+            [p for p in model.parameters() if p.requires_grad],
+            lr=config.REID_LR,
+            weight_decay=1e-4,
+            fused=config.DEVICE == "cuda"  # Multi-tensor CUDA kernel
+        )
         scheduler = optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=config.REID_EPOCHS)
         
         # Log parameters
@@ -418,12 +840,32 @@ def train_reid_model(config: Config):
             "model": "ResNet50_ReID",
             "embedding_dim": config.REID_EMBEDDING_DIM,
             "epochs": config.REID_EPOCHS,
-            "batch_size": config.REID_BATCH,
+            # Batch-hard batches come from PKSampler, not REID_BATCH
+            "batch_size": (
+                config.REID_P * config.REID_K if config.BATCH_HARD_MINING else config.REID_BATCH
+            ),
+            "reid_p": config.REID_P,
+            "reid_k": config.REID_K,
             "learning_rate": config.REID_LR,
             "triplet_margin": config.TRIPLET_MARGIN,
-            "num_animals": num_animals
+            "batch_hard_mining": config.BATCH_HARD_MINING,
+            "accum_steps": config.REID_ACCUM_STEPS,
+            "xbm_size": config.XBM_SIZE,
+            "num_animals": num_animals,
+            # Checkpoints have no classifier.* keys: rebuild with this to load strictly
+            "use_classifier": model.classifier is not None
         })
         
+        # Mixed precision: loss scaling keeps FP16 gradients from underflowing
+        scaler = torch.cuda.amp.GradScaler(enabled=config.USE_AMP)
+        
+        # Grads are accumulated over REID_ACCUM_STEPS micro-batches per step;
+        # needs the non-cudagraph compile above so .grad persists across backwards
+        accum_steps = config.REID_ACCUM_STEPS
+        memory = None
+        if config.BATCH_HARD_MINING and config.XBM_SIZE > 0:
+            memory = CrossBatchMemory(config.XBM_SIZE, config.REID_EMBEDDING_DIM, config.DEVICE)
+        
         # Training loop
         best_val_loss = float('inf')
         
@@ -431,67 +873,89 @@ def train_reid_model(config: Config):
             # Train
             model.train()
             train_loss = 0.0
+            use_memory = memory is not None and epoch >= config.XBM_START_EPOCH
+            optimizer.zero_grad(set_to_none=True)
             
-            for batch in train_loader:
-                anchor, positive, negative, _ = batch
-                anchor = anchor.to(config.DEVICE)
-                positive = positive.to(config.DEVICE)
-                negative = negative.to(config.DEVICE)
-                
-                # Forward
-                anchor_emb = model(anchor)
-                pos_emb = model(positive)
-                neg_emb = model(negative)
-                
-                # Loss
-                loss = triplet_loss(anchor_emb, pos_emb, neg_emb)
+            for step, batch in enumerate(train_loader):
+                # Forward (normalize/BatchNorm are kept in FP32 by autocast)
+                if config.BATCH_HARD_MINING:
+                    images, labels = batch
+                    images = gpu_augment(images.to(config.DEVICE, non_blocking=True), gpu_augs)
+                    labels = labels.to(config.DEVICE, non_blocking=True)
+                    
+                    with torch.cuda.amp.autocast(enabled=config.USE_AMP, dtype=torch.float16):
+                        embeddings = compiled_model(images)
+                        if use_memory:
+                            loss = triplet_loss(embeddings, labels, *memory.get())
+                        else:
+                            loss = triplet_loss(embeddings, labels)
+                    
+                    if use_memory:
+                        memory.enqueue(embeddings, labels)
+                else:
+                    anchor, positive, negative, _ = batch
+                    anchor = anchor.to(config.DEVICE, non_blocking=True)
+                    positive = positive.to(config.DEVICE, non_blocking=True)
+                    negative = negative.to(config.DEVICE, non_blocking=True)
+                    images = gpu_augment(torch.cat([anchor, positive, negative], dim=0), gpu_augs)
+                    
+                    # Single forward over all three sets (same domain, so BatchNorm stats are fine)
+                    with torch.cuda.amp.autocast(enabled=config.USE_AMP, dtype=torch.float16):
+                        emb = compiled_model(images)
+                        anchor_emb, pos_emb, neg_emb = emb.chunk(3, dim=0)
+                        
+                        # Loss
+                        loss = triplet_loss(anchor_emb, pos_emb, neg_emb)
                 
                 # Backward
-                optimizer.zero_grad()
-                loss.backward()
-                optimizer.step()
+                scaler.scale(loss / accum_steps).backward()
+                if (step + 1) % accum_steps == 0 or step + 1 == len(train_loader):
+                    scaler.step(optimizer)
+                    scaler.update()
+                    optimizer.zero_grad(set_to_none=True)
                 
                 train_loss += loss.item()
             
             train_loss /= len(train_loader)
             
-            # Validation
-            model.eval()
-            val_loss = 0.0
-            
-            with torch.no_grad():
-                # Simple validation: compute average embedding distance
-                embeddings = []
-                labels = []
-                
-                for images, animal_ids in val_loader:
-                    images = images.to(config.DEVICE)
-                    embs = model(images)
-                    embeddings.append(embs.cpu())
-                    labels.extend(animal_ids)
-                
-                embeddings = torch.cat(embeddings)
-                # Compute pairwise distances (simplified)
-                distances = torch.cdist(embeddings, embeddings)
-                val_loss = distances.mean().item()
-            
             # Scheduler step
             scheduler.step()
             
-            # Logging
-            logger.info(
-                f"Epoch [{epoch+1}/{config.REID_EPOCHS}] | "
-                f"Train Loss: {train_loss:.4f} | Val Loss: {val_loss:.4f}"
-            )
-            
-            mlflow.log_metrics({
+            metrics = {
                 "train_loss": train_loss,
-                "val_loss": val_loss,
                 "learning_rate": scheduler.get_last_lr()[0]
-            }, step=epoch)
+            }
+            log_line = f"Epoch [{epoch+1}/{config.REID_EPOCHS}] | Train Loss: {train_loss:.4f}"
+            
+            # Validation (every REID_VAL_EVERY epochs and on the last one)
+            run_val = (epoch + 1) % config.REID_VAL_EVERY == 0 or epoch == config.REID_EPOCHS - 1
+            if run_val:
+                model.eval()
+                
+                with torch.inference_mode():
+                    # Simple validation: average embedding distance + rank-1 retrieval
+                    embeddings = []
+                    labels = []
+                    
+                    with torch.cuda.amp.autocast(enabled=config.USE_AMP):
+                        for images, animal_ids in val_loader:
+                            images = images.to(config.DEVICE, non_blocking=True, memory_format=torch.channels_last)
+                            embeddings.append(compiled_model(images).float())
+                            labels.append(animal_ids)
+                    
+                    embeddings = torch.cat(embeddings)
+                    labels = torch.cat(labels).to(config.DEVICE)
+                    val_loss, val_rank1 = reid_retrieval_metrics(embeddings, labels)
+                
+                metrics.update(val_loss=val_loss, val_rank1=val_rank1)
+                log_line += f" | Val Loss: {val_loss:.4f} | Val Rank-1: {val_rank1:.4f}"
+            
+            # Logging
+            logger.info(log_line)
+            mlflow.log_metrics(metrics, step=epoch, synchronous=False)  # Flushed at end_run
             
             # Save best model
-            if val_loss < best_val_loss:
+            if run_val and val_loss < best_val_loss:
                 best_val_loss = val_loss
                 model_path = config.OUTPUT_DIR / "reid_best.pt"
                 torch.save(model.state_dict(), model_path)